@@ -12,18 +12,32 @@ Features implemented (mock/in-memory with optional JSON persistence):
 - Simple audit logging & ticketing
 
 Run:
-    pip install flask flask_cors
+    pip install flask flask_cors orjson msgspec waitress
     python university_helpdesk_api.py
 
-The app stores runtime state in `data_store.json` for convenience (ignored by git by default).
+The app stores runtime state under `data_store/` for convenience (ignored by git by default),
+one `<key>.json` shard per top-level collection. Mutations are appended to
+`data_store/changes.wal` (one JSON record per line) and a background thread periodically
+rewrites only the shards that changed; on startup the shards are loaded and the WAL
+replayed on top of them. Audit entries are queued and appended to
+`data_store/audit_logs.jsonl` in batches by a dedicated writer thread.
 """
 
-from flask import Flask, jsonify, request, abort
+from flask import Flask, request, abort, g
 from flask_cors import CORS
-import uuid
+from typing import Annotated
+import msgspec
+import orjson
+import bisect
+import functools
+import hashlib
+import itertools
+import secrets
 import datetime
-import json
+import queue
 import threading
+from collections import defaultdict
+import time
 import os
 
 APP = Flask(__name__)
@@ -32,21 +46,75 @@ from flask import Flask
 app = Flask(__name__)
 
 
-DATA_FILE = "data_store.json"
+DATA_DIR = os.environ.get("DATA_DIR", "data_store")
+WAL_FILE = os.path.join(DATA_DIR, "changes.wal")
+AUDIT_FILE = os.path.join(DATA_DIR, "audit_logs.jsonl")
+# single-file layout used before the store was sharded
+LEGACY_DATA_FILE = "data_store.json"
+LEGACY_FILES = {"data_store.wal": WAL_FILE, "audit.log": AUDIT_FILE}
+SNAPSHOT_INTERVAL = int(os.environ.get("SNAPSHOT_INTERVAL", 30))
+AUDIT_FLUSH_INTERVAL = float(os.environ.get("PluginAuditLogFlushInterval", 1.0))
+AUDIT_BUFFER_SIZE = int(os.environ.get("PluginAuditLogBufferSize", 500))
+AUDIT_Q = queue.Queue(maxsize=10000)
+AUDIT_COUNTER_DROPPED = 0
 LOCK = threading.Lock()
+# keeps DATA["audit_logs"], AUDIT_TIMES and AUDIT_SEQ in step
+AUDIT_LOCK = threading.Lock()
+# top-level DATA keys changed since their shard was last written
+DIRTY_KEYS = set()
+# per-resource locks guarding check-then-mutate sequences
+COURSE_LOCKS = defaultdict(threading.Lock)
+HOSTEL_LOCKS = defaultdict(threading.Lock)
+EVENT_LOCKS = defaultdict(threading.Lock)
+OTP_LOCKS = defaultdict(threading.Lock)
+# serialized bodies of read-mostly listings, keyed by name; see cached_json()
+RESPONSE_CACHE = {}
+CACHE_GEN = defaultdict(int)
+CACHE_LOCK = threading.Lock()
+# WAL records produced by the current request(s), written out by flush_if_dirty()
+PENDING = []
 
 # ---------------- Utilities ----------------
-def now_iso():
-    return datetime.datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+def fastjsonify(obj):
+    return APP.response_class(orjson.dumps(obj), mimetype="application/json")
+
+def cached_json(key, build):
+    """Serve build() as JSON, reusing the bytes until invalidate(key)."""
+    entry = RESPONSE_CACHE.get(key)
+    if entry is None:
+        gen = CACHE_GEN[key]
+        body = orjson.dumps(build())
+        entry = (body, hashlib.sha1(body).hexdigest())
+        with CACHE_LOCK:
+            # don't publish a body built from data that changed meanwhile
+            if CACHE_GEN[key] == gen:
+                RESPONSE_CACHE[key] = entry
+    body, etag = entry
+    if request.if_none_match.contains(etag):
+        resp = APP.response_class(status=304)
+    else:
+        resp = APP.response_class(body, mimetype="application/json")
+    resp.set_etag(etag)
+    return resp
 
-def load_data():
-    if os.path.exists(DATA_FILE):
-        try:
-            with open(DATA_FILE, "r") as f:
-                return json.load(f)
-        except Exception:
-            pass
-    # defaults
+def invalidate(key):
+    with CACHE_LOCK:
+        CACHE_GEN[key] += 1
+        RESPONSE_CACHE.pop(key, None)
+
+def new_id():
+    return secrets.token_hex(16)
+
+def iso_z(dt):
+    return dt.isoformat() + "Z"
+
+def to_epoch(iso):
+    dt = datetime.datetime.fromisoformat(iso.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.timestamp()
+
+def default_data():
     return {
         "students": {},
         "courses": {},
@@ -67,24 +135,261 @@ def load_data():
         "audit_logs": []
     }
 
-def save_data(data):
+def apply_change(data, rec):
+    op = rec.get("op")
+    if op == "set":
+        data.setdefault(rec["key"], {})[rec["id"]] = rec["value"]
+    elif op == "pop":
+        data.get(rec["key"], {}).pop(rec["id"], None)
+
+def shard_path(key):
+    return os.path.join(DATA_DIR, key + ".json")
+
+def migrate_legacy_files():
+    os.makedirs(DATA_DIR, exist_ok=True)
+    # the WAL and audit log formats are unchanged, only their location moved
+    for old, new in LEGACY_FILES.items():
+        if os.path.exists(old) and not os.path.exists(new):
+            os.replace(old, new)
+
+def retire_legacy_snapshot():
+    """Fold a legacy data_store.json into DATA_DIR once its shards are written."""
+    if not os.path.exists(LEGACY_DATA_FILE):
+        return
+    try:
+        with open(LEGACY_DATA_FILE, "rb") as f:
+            legacy_logs = orjson.loads(f.read()).get("audit_logs") or []
+    except Exception:
+        legacy_logs = []
+    if legacy_logs:
+        # baseline stores kept audit history only in the snapshot; it predates
+        # anything already in the audit log, so it goes first
+        existing = b""
+        if os.path.exists(AUDIT_FILE):
+            with open(AUDIT_FILE, "rb") as f:
+                existing = f.read()
+        tmp = AUDIT_FILE + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(b"".join(orjson.dumps(e) + b"\n" for e in legacy_logs) + existing)
+        os.replace(tmp, AUDIT_FILE)
+    os.replace(LEGACY_DATA_FILE, LEGACY_DATA_FILE + ".migrated")
+
+def repair_audit_log():
+    """Cut a torn trailing line so the writer starts appending on a fresh line."""
+    if not os.path.exists(AUDIT_FILE):
+        return
+    with open(AUDIT_FILE, "r+b") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+def load_data():
+    data = default_data()
+    # shards written since override the legacy snapshot key by key
+    if os.path.exists(LEGACY_DATA_FILE):
+        try:
+            with open(LEGACY_DATA_FILE, "rb") as f:
+                data.update(orjson.loads(f.read()))
+        except Exception:
+            pass
+    for key in list(data):
+        path = shard_path(key)
+        if key == "audit_logs" or not os.path.exists(path):
+            continue
+        try:
+            with open(path, "rb") as f:
+                data[key] = orjson.loads(f.read())
+        except Exception:
+            pass
+    # replay mutations recorded since the last snapshot
+    if os.path.exists(WAL_FILE):
+        with open(WAL_FILE, "rb") as f:
+            for line in f:
+                try:
+                    rec = orjson.loads(line)
+                except ValueError:
+                    # torn trailing write from a crash
+                    break
+                apply_change(data, rec)
+    # waitlists are insertion-ordered {student_id: requested_at}; convert the
+    # older list-of-dicts form
+    for key in ("waitlists", "event_waitlists"):
+        for code, wl in data.get(key, {}).items():
+            if isinstance(wl, list):
+                data[key][code] = {w["student_id"]: w["requested_at"] for w in wl}
+    # audit entries live in their own append-only log
+    logs = data.setdefault("audit_logs", [])
+    if os.path.exists(AUDIT_FILE):
+        with open(AUDIT_FILE, "rb") as f:
+            for line in f:
+                try:
+                    logs.append(orjson.loads(line))
+                except ValueError:
+                    # skip a damaged line rather than hiding everything after it
+                    continue
+    return data
+
+def audit_times(logs):
+    # running max: a slow request can append an entry stamped earlier than the
+    # one before it, and the bisect keys must stay sorted regardless
+    times, last = [], float("-inf")
+    for entry in logs:
+        last = max(last, to_epoch(entry["time"]))
+        times.append(last)
+    return times
+
+def last_audit_id(logs):
+    # ids were UUID strings before the sequence was introduced
+    for entry in reversed(logs):
+        if isinstance(entry.get("id"), int):
+            return entry["id"]
+    return 0
+
+def student_course_index(enrollments):
+    index = {}
+    for course_code, students in enrollments.items():
+        for sid in students:
+            index.setdefault(sid, []).append(course_code)
+    return index
+
+def append_change(op, payload):
+    with LOCK:
+        # serialize under the lock so WAL order matches the order values were captured
+        PENDING.append(orjson.dumps({"op": op, **payload}) + b"\n")
+        DIRTY_KEYS.add(payload["key"])
+
+def flush_if_dirty():
     with LOCK:
-        with open(DATA_FILE, "w") as f:
-            json.dump(data, f, indent=2)
+        if not PENDING:
+            return
+        WAL.write(b"".join(PENDING))
+        WAL.flush()
+        PENDING.clear()
+
+def record(key, item_id):
+    """Log the current value of DATA[key][item_id] to the WAL."""
+    append_change("set", {"key": key, "id": item_id, "value": DATA[key][item_id]})
+
+def snapshot():
+    with LOCK:
+        for key in DIRTY_KEYS:
+            path = shard_path(key)
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(orjson.dumps(DATA[key]))
+            os.replace(tmp, path)
+        DIRTY_KEYS.clear()
+        WAL.seek(0)
+        WAL.truncate()
+
+def snapshot_loop():
+    while True:
+        time.sleep(SNAPSHOT_INTERVAL)
+        snapshot()
+
+def audit_writer():
+    with open(AUDIT_FILE, "ab") as f:
+        while True:
+            try:
+                batch = [AUDIT_Q.get(timeout=AUDIT_FLUSH_INTERVAL)]
+            except queue.Empty:
+                continue
+            while len(batch) < AUDIT_BUFFER_SIZE:
+                try:
+                    batch.append(AUDIT_Q.get_nowait())
+                except queue.Empty:
+                    break
+            f.write(b"\n".join(orjson.dumps(e) for e in batch) + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
 
 def audit(user, action, details=None):
-    entry = {
-        "id": str(uuid.uuid4()),
-        "time": now_iso(),
-        "user": user,
-        "action": action,
-        "details": details or {}
-    }
-    DATA["audit_logs"].append(entry)
-    save_data(DATA)
+    global AUDIT_COUNTER_DROPPED
+    with AUDIT_LOCK:
+        entry = {
+            "id": next(AUDIT_SEQ),
+            "time": g.now_iso,
+            "user": user,
+            "action": action,
+            "details": details or {}
+        }
+        DATA["audit_logs"].append(entry)
+        AUDIT_TIMES.append(max(AUDIT_TIMES[-1], g.now_ts) if AUDIT_TIMES else g.now_ts)
+    try:
+        AUDIT_Q.put_nowait(entry)
+    except queue.Full:
+        AUDIT_COUNTER_DROPPED += 1
+
+# ---------------- Request bodies ----------------
+NonEmptyStr = Annotated[str, msgspec.Meta(min_length=1)]
+
+class PaymentReq(msgspec.Struct):
+    amount: float
+
+class EnrollReq(msgspec.Struct):
+    student_id: NonEmptyStr
+    course_code: NonEmptyStr
+
+class SpecialExamReq(msgspec.Struct):
+    student_id: NonEmptyStr
+    course_code: NonEmptyStr
+    # free-text fields accept an explicit null, as request.json did; read back as ""
+    reason: str | None = ""
+
+class HostelBookReq(msgspec.Struct):
+    student_id: NonEmptyStr
+    hostel_id: NonEmptyStr
+
+class MaintenanceReq(msgspec.Struct):
+    student_id: NonEmptyStr
+    hostel_id: NonEmptyStr
+    description: str | None = ""
+
+class LeaveReq(msgspec.Struct):
+    student_id: NonEmptyStr
+    start_date: NonEmptyStr
+    end_date: NonEmptyStr
+    reason: str | None = ""
+
+class EventRegisterReq(msgspec.Struct):
+    student_id: NonEmptyStr
+    event_id: NonEmptyStr
+
+class OtpRequestReq(msgspec.Struct):
+    student_id: NonEmptyStr
+
+class OtpConfirmReq(msgspec.Struct):
+    student_id: NonEmptyStr
+    otp: NonEmptyStr
+
+# strict=False keeps accepting numeric strings such as "100.0" for amount
+PAYMENT_DEC = msgspec.json.Decoder(PaymentReq, strict=False)
+ENROLL_DEC = msgspec.json.Decoder(EnrollReq)
+SPECIAL_EXAM_DEC = msgspec.json.Decoder(SpecialExamReq)
+HOSTEL_BOOK_DEC = msgspec.json.Decoder(HostelBookReq)
+MAINTENANCE_DEC = msgspec.json.Decoder(MaintenanceReq)
+LEAVE_DEC = msgspec.json.Decoder(LeaveReq)
+EVENT_REGISTER_DEC = msgspec.json.Decoder(EventRegisterReq)
+OTP_REQUEST_DEC = msgspec.json.Decoder(OtpRequestReq)
+OTP_CONFIRM_DEC = msgspec.json.Decoder(OtpConfirmReq)
+
+def decode_body(decoder):
+    try:
+        return decoder.decode(request.get_data())
+    except msgspec.DecodeError as exc:
+        # ValidationError (missing/mistyped field) is a DecodeError subclass
+        abort(400, str(exc))
 
 # ---------------- Initialize data ----------------
+migrate_legacy_files()
+repair_audit_log()
 DATA = load_data()
+# bisect keys for DATA["audit_logs"]: entry times as a running max (see audit_times)
+AUDIT_TIMES = audit_times(DATA["audit_logs"])
+AUDIT_SEQ = itertools.count(last_audit_id(DATA["audit_logs"]) + 1)
+# inverted enrollments: student_id -> course codes
+STUDENT_COURSES = student_course_index(DATA["enrollments"])
+WAL = open(WAL_FILE, "ab")
 
 # seed some data if empty
 if not DATA["students"]:
@@ -122,36 +427,53 @@ if not DATA["events"]:
         "EVT100": {"id": "EVT100", "title": "Freshers Meet", "capacity": 2}
     }
 
-save_data(DATA)
+# write every shard once so seeds and any legacy snapshot land in DATA_DIR
+DIRTY_KEYS.update(k for k in DATA if k != "audit_logs")
+snapshot()
+retire_legacy_snapshot()
+threading.Thread(target=snapshot_loop, daemon=True).start()
+threading.Thread(target=audit_writer, daemon=True).start()
+
+@APP.before_request
+def stamp_request_time():
+    # one clock read per request, shared by every timestamp the handler writes
+    g.now = datetime.datetime.utcnow().replace(microsecond=0)
+    g.now_iso = iso_z(g.now)
+    g.now_ts = g.now.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+@APP.after_request
+def persist_changes(response):
+    flush_if_dirty()
+    return response
 
 # ---------------- Fees endpoints ----------------
+# shared default for students without a fees record; only ever read
+NO_FEES = {"balance": 0.0, "items": []}
+
 @APP.route("/fees/<student_id>", methods=["GET"])
 def get_fees(student_id):
-    fees = DATA["fees"].get(student_id, {"balance": 0.0, "items": []})
+    fees = DATA["fees"].get(student_id, NO_FEES)
     audit(student_id, "check_fees")
-    return jsonify({"student_id": student_id, **fees})
+    return fastjsonify({"student_id": student_id, **fees})
 
 @APP.route("/fees/pay/<student_id>", methods=["POST"])
 def create_payment(student_id):
-    body = request.json or {}
-    amount = body.get("amount")
-    if amount is None:
-        abort(400, "amount required")
-    token = str(uuid.uuid4())
+    amount = decode_body(PAYMENT_DEC).amount
+    token = new_id()
     payment = {
         "id": token,
         "student_id": student_id,
-        "amount": float(amount),
-        "created": now_iso(),
+        "amount": amount,
+        "created": g.now_iso,
         "status": "pending",
-        "expires_at": (datetime.datetime.utcnow() + datetime.timedelta(hours=1)).replace(microsecond=0).isoformat() + "Z"
+        "expires_at": iso_z(g.now + datetime.timedelta(hours=1))
     }
     DATA["payments"][token] = payment
-    save_data(DATA)
+    record("payments", token)
     audit(student_id, "generate_payment", {"payment_id": token, "amount": amount})
     # mock payment link
     link = f"https://payments.example/university/pay/{token}"
-    return jsonify({"payment_id": token, "payment_link": link, "expires_at": payment["expires_at"]})
+    return fastjsonify({"payment_id": token, "payment_link": link, "expires_at": payment["expires_at"]})
 
 @APP.route("/fees/pay/callback/<payment_id>", methods=["POST"])
 def payment_callback(payment_id):
@@ -159,135 +481,133 @@ def payment_callback(payment_id):
     if not payment:
         abort(404)
     payment["status"] = "completed"
-    payment["completed_at"] = now_iso()
+    payment["completed_at"] = g.now_iso
     sid = payment["student_id"]
     if sid in DATA["fees"]:
         DATA["fees"][sid]["balance"] = max(0.0, DATA["fees"][sid]["balance"] - payment["amount"])
         DATA["fees"][sid]["items"].append({"desc": "Online payment", "amount": -payment["amount"]})
-    save_data(DATA)
+        record("fees", sid)
+    record("payments", payment_id)
     audit(sid, "payment_completed", {"payment_id": payment_id})
-    return jsonify({"ok": True, "payment_id": payment_id})
+    return fastjsonify({"ok": True, "payment_id": payment_id})
 
 # ---------------- Enrollment & waitlist ----------------
 @APP.route("/enroll", methods=["POST"])
 def enroll():
-    body = request.json or {}
-    student_id = body.get("student_id")
-    course_code = body.get("course_code")
-    if not student_id or not course_code:
-        abort(400, "student_id and course_code required")
+    req = decode_body(ENROLL_DEC)
+    student_id, course_code = req.student_id, req.course_code
     course = DATA["courses"].get(course_code)
     if not course:
         abort(404, "course not found")
 
-    enrollments = DATA.setdefault("enrollments", {}).setdefault(course_code, [])
-    waitlist = DATA.setdefault("waitlists", {}).setdefault(course_code, [])
-
-    if student_id in enrollments:
-        return jsonify({"status": "already_enrolled", "course": course_code})
-    if len(enrollments) < course.get("capacity", 0):
-        enrollments.append(student_id)
-        save_data(DATA)
-        audit(student_id, "enrolled", {"course": course_code})
-        return jsonify({"status": "enrolled", "course": course_code})
-    else:
-        if any(w.get("student_id") == student_id for w in waitlist):
-            return jsonify({"status": "already_waitlisted", "course": course_code})
-        waitlist.append({"student_id": student_id, "requested_at": now_iso()})
-        save_data(DATA)
-        audit(student_id, "waitlisted", {"course": course_code})
-        return jsonify({"status": "waitlisted", "course": course_code})
+    with COURSE_LOCKS[course_code]:
+        enrollments = DATA["enrollments"].get(course_code)
+        if enrollments is None:
+            enrollments = DATA["enrollments"][course_code] = []
+
+        if student_id in enrollments:
+            return fastjsonify({"status": "already_enrolled", "course": course_code})
+        if len(enrollments) < course.get("capacity", 0):
+            enrollments.append(student_id)
+            # keyed by student while we hold a course lock: setdefault is atomic
+            STUDENT_COURSES.setdefault(student_id, []).append(course_code)
+            record("enrollments", course_code)
+            audit(student_id, "enrolled", {"course": course_code})
+            return fastjsonify({"status": "enrolled", "course": course_code})
+        else:
+            waitlist = DATA["waitlists"].get(course_code)
+            if waitlist is None:
+                waitlist = DATA["waitlists"][course_code] = {}
+            if student_id in waitlist:
+                position = list(waitlist).index(student_id) + 1
+                return fastjsonify({"status": "already_waitlisted", "course": course_code, "position": position})
+            waitlist[student_id] = g.now_iso
+            record("waitlists", course_code)
+            audit(student_id, "waitlisted", {"course": course_code})
+            return fastjsonify({"status": "waitlisted", "course": course_code, "position": len(waitlist)})
 
 @APP.route("/enroll/status/<course_code>", methods=["GET"])
 def enroll_status(course_code):
-    enrollments = DATA.get("enrollments", {}).get(course_code, [])
-    waitlist = DATA.get("waitlists", {}).get(course_code, [])
-    return jsonify({"course": course_code, "enrolled": enrollments, "waitlist": waitlist})
+    if course_code not in DATA["courses"]:
+        # nothing can be enrolled; don't mint a lock for an arbitrary URL segment
+        return fastjsonify({"course": course_code, "enrolled": [], "waitlist": []})
+    # enroll() mutates these under the course lock; don't iterate them mid-insert
+    with COURSE_LOCKS[course_code]:
+        enrollments = DATA.get("enrollments", {}).get(course_code, [])
+        waitlist = [{"student_id": s, "requested_at": t} for s, t in DATA.get("waitlists", {}).get(course_code, {}).items()]
+        return fastjsonify({"course": course_code, "enrolled": enrollments, "waitlist": waitlist})
 
 # ---------------- Exam timetable & special arrangements ----------------
 @APP.route("/exam/timetable/<student_id>", methods=["GET"])
 def exam_timetable(student_id):
     # return timetable for courses the student is enrolled in
-    student_courses = [c for c, studs in DATA.get("enrollments", {}).items() if student_id in studs]
+    student_courses = STUDENT_COURSES.get(student_id, [])
     timetable = {c: DATA.get("exam_timetables", {}).get(c, []) for c in student_courses}
     audit(student_id, "view_exam_timetable")
-    return jsonify({"student_id": student_id, "timetable": timetable})
+    return fastjsonify({"student_id": student_id, "timetable": timetable})
 
 @APP.route("/exam/special", methods=["POST"])
 def request_special_exam():
-    body = request.json or {}
-    sid = body.get("student_id")
-    course = body.get("course_code")
-    reason = body.get("reason", "")
-    if not sid or not course:
-        abort(400, "student_id and course_code required")
-    ticket_id = str(uuid.uuid4())
+    req = decode_body(SPECIAL_EXAM_DEC)
+    sid, course, reason = req.student_id, req.course_code, req.reason or ""
+    ticket_id = new_id()
     ticket = {
         "id": ticket_id,
         "student_id": sid,
         "course": course,
         "reason": reason,
         "status": "submitted",
-        "created": now_iso()
+        "created": g.now_iso
     }
-    DATA.setdefault("exam_special_requests", {})[ticket_id] = ticket
-    save_data(DATA)
+    DATA["exam_special_requests"][ticket_id] = ticket
+    record("exam_special_requests", ticket_id)
     audit(sid, "special_exam_request", {"ticket_id": ticket_id})
-    return jsonify({"ticket_id": ticket_id, "status": "submitted"})
+    return fastjsonify({"ticket_id": ticket_id, "status": "submitted"})
 
 # ---------------- Hostel booking & maintenance ----------------
 @APP.route("/hostel/availability", methods=["GET"])
 def hostel_availability():
-    return jsonify(DATA.get("hostels", {}))
+    return cached_json("hostels", lambda: DATA.get("hostels", {}))
 
 @APP.route("/hostel/book", methods=["POST"])
 def hostel_book():
-    body = request.json or {}
-    sid = body.get("student_id")
-    hostel_id = body.get("hostel_id")
-    if not sid or not hostel_id:
-        abort(400, "student_id and hostel_id required")
+    req = decode_body(HOSTEL_BOOK_DEC)
+    sid, hostel_id = req.student_id, req.hostel_id
     hostel = DATA.get("hostels", {}).get(hostel_id)
     if not hostel:
         abort(404, "hostel not found")
-    if hostel.get("rooms_available", 0) <= 0:
-        return jsonify({"status": "full"})
-    booking_id = str(uuid.uuid4())
-    DATA.setdefault("hostel_bookings", {})[booking_id] = {
-        "id": booking_id, "student_id": sid, "hostel_id": hostel_id, "created": now_iso()
-    }
-    hostel["rooms_available"] = max(0, hostel.get("rooms_available", 1) - 1)
-    save_data(DATA)
-    audit(sid, "hostel_booked", {"booking_id": booking_id, "hostel_id": hostel_id})
-    return jsonify({"status": "booked", "booking_id": booking_id})
+    with HOSTEL_LOCKS[hostel_id]:
+        if hostel.get("rooms_available", 0) <= 0:
+            return fastjsonify({"status": "full"})
+        booking_id = new_id()
+        DATA["hostel_bookings"][booking_id] = {
+            "id": booking_id, "student_id": sid, "hostel_id": hostel_id, "created": g.now_iso
+        }
+        hostel["rooms_available"] = max(0, hostel.get("rooms_available", 1) - 1)
+        record("hostel_bookings", booking_id)
+        record("hostels", hostel_id)
+        invalidate("hostels")
+        audit(sid, "hostel_booked", {"booking_id": booking_id, "hostel_id": hostel_id})
+        return fastjsonify({"status": "booked", "booking_id": booking_id})
 
 @APP.route("/hostel/maintenance", methods=["POST"])
 def hostel_maintenance():
-    body = request.json or {}
-    sid = body.get("student_id")
-    hostel_id = body.get("hostel_id")
-    desc = body.get("description", "")
-    if not sid or not hostel_id:
-        abort(400, "student_id and hostel_id required")
-    ticket_id = str(uuid.uuid4())
-    DATA.setdefault("maintenance_tickets", {})[ticket_id] = {
+    req = decode_body(MAINTENANCE_DEC)
+    sid, hostel_id, desc = req.student_id, req.hostel_id, req.description or ""
+    ticket_id = new_id()
+    DATA["maintenance_tickets"][ticket_id] = {
         "id": ticket_id, "student_id": sid, "hostel_id": hostel_id, "description": desc,
-        "status": "open", "created": now_iso()
+        "status": "open", "created": g.now_iso
     }
-    save_data(DATA)
+    record("maintenance_tickets", ticket_id)
     audit(sid, "maintenance_ticket", {"ticket_id": ticket_id})
-    return jsonify({"ticket_id": ticket_id, "status": "open"})
+    return fastjsonify({"ticket_id": ticket_id, "status": "open"})
 
 # ---------------- Leave applications with auto-approve ----------------
 @APP.route("/leave/apply", methods=["POST"])
 def leave_apply():
-    body = request.json or {}
-    sid = body.get("student_id")
-    start = body.get("start_date")
-    end = body.get("end_date")
-    reason = body.get("reason", "")
-    if not sid or not start or not end:
-        abort(400, "student_id, start_date and end_date required")
+    req = decode_body(LEAVE_DEC)
+    sid, start, end, reason = req.student_id, req.start_date, req.end_date, req.reason or ""
     try:
         sdate = datetime.datetime.fromisoformat(start)
         edate = datetime.datetime.fromisoformat(end)
@@ -296,113 +616,145 @@ def leave_apply():
     duration_days = (edate - sdate).days + 1
     # simple auto-approve rule: <=3 days and reason provided
     status = "approved" if (duration_days <= 3 and reason) else "pending"
-    lr_id = str(uuid.uuid4())
-    DATA.setdefault("leave_requests", {})[lr_id] = {
+    lr_id = new_id()
+    DATA["leave_requests"][lr_id] = {
         "id": lr_id, "student_id": sid, "start": start, "end": end,
-        "reason": reason, "status": status, "created": now_iso()
+        "reason": reason, "status": status, "created": g.now_iso
     }
-    save_data(DATA)
+    record("leave_requests", lr_id)
     audit(sid, "leave_applied", {"leave_id": lr_id, "status": status})
-    return jsonify({"leave_id": lr_id, "status": status, "duration_days": duration_days})
+    return fastjsonify({"leave_id": lr_id, "status": status, "duration_days": duration_days})
 
 # ---------------- Events registration & waitlist ----------------
 @APP.route("/events/register", methods=["POST"])
 def event_register():
-    body = request.json or {}
-    sid = body.get("student_id")
-    event_id = body.get("event_id")
-    if not sid or not event_id:
-        abort(400, "student_id and event_id required")
+    req = decode_body(EVENT_REGISTER_DEC)
+    sid, event_id = req.student_id, req.event_id
     event = DATA.get("events", {}).get(event_id)
     if not event:
         abort(404, "event not found")
-    regs = DATA.setdefault("event_registrations", {}).setdefault(event_id, [])
-    if sid in regs:
-        return jsonify({"status": "already_registered"})
-    if len(regs) < event.get("capacity", 0):
-        regs.append(sid)
-        save_data(DATA)
-        audit(sid, "event_registered", {"event_id": event_id})
-        return jsonify({"status": "registered"})
-    else:
-        wl = DATA.setdefault("event_waitlists", {}).setdefault(event_id, [])
-        wl.append({"student_id": sid, "requested_at": now_iso()})
-        save_data(DATA)
-        audit(sid, "event_waitlisted", {"event_id": event_id})
-        return jsonify({"status": "waitlisted"})
+    with EVENT_LOCKS[event_id]:
+        regs = DATA["event_registrations"].get(event_id)
+        if regs is None:
+            regs = DATA["event_registrations"][event_id] = []
+        if sid in regs:
+            return fastjsonify({"status": "already_registered"})
+        if len(regs) < event.get("capacity", 0):
+            regs.append(sid)
+            record("event_registrations", event_id)
+            audit(sid, "event_registered", {"event_id": event_id})
+            return fastjsonify({"status": "registered"})
+        else:
+            wl = DATA["event_waitlists"].get(event_id)
+            if wl is None:
+                wl = DATA["event_waitlists"][event_id] = {}
+            if sid in wl:
+                return fastjsonify({"status": "already_waitlisted"})
+            wl[sid] = g.now_iso
+            record("event_waitlists", event_id)
+            audit(sid, "event_waitlisted", {"event_id": event_id})
+            return fastjsonify({"status": "waitlisted"})
 
 # ---------------- OTP identity verification ----------------
 @APP.route("/verify/otp/request", methods=["POST"])
 def request_otp():
-    body = request.json or {}
-    sid = body.get("student_id")
-    if not sid:
-        abort(400, "student_id required")
-    code = str(uuid.uuid4())[:6]
-    exp = (datetime.datetime.utcnow() + datetime.timedelta(minutes=5)).replace(microsecond=0).isoformat() + "Z"
-    DATA.setdefault("otps", {})[sid] = {"code": code, "expires_at": exp}
-    save_data(DATA)
+    sid = decode_body(OTP_REQUEST_DEC).student_id
+    code = secrets.token_hex(3).upper()
+    exp = iso_z(g.now + datetime.timedelta(minutes=5))
+    with OTP_LOCKS[sid]:
+        DATA["otps"][sid] = {"code": code, "expires_at": exp, "exp_ts": g.now_ts + 300}
+        record("otps", sid)
     audit(sid, "otp_requested")
     # for testing we return the code (in production you'd send via SMS/email)
-    return jsonify({"student_id": sid, "otp": code, "expires_at": exp})
+    return fastjsonify({"student_id": sid, "otp": code, "expires_at": exp})
 
 @APP.route("/verify/otp/confirm", methods=["POST"])
 def confirm_otp():
-    body = request.json or {}
-    sid = body.get("student_id")
-    code = body.get("otp")
-    if not sid or not code:
-        abort(400, "student_id and otp required")
-    rec = DATA.get("otps", {}).get(sid)
-    if not rec:
-        return jsonify({"verified": False, "reason": "no_otp_requested"}), 400
-    # compare code and expiration
-    if rec.get("code") != code:
-        return jsonify({"verified": False, "reason": "invalid_code"}), 400
-    if datetime.datetime.fromisoformat(rec["expires_at"].replace("Z", "")) < datetime.datetime.utcnow():
-        return jsonify({"verified": False, "reason": "expired"}), 400
-    DATA["otps"].pop(sid, None)
-    save_data(DATA)
-    audit(sid, "otp_verified")
-    return jsonify({"verified": True})
+    req = decode_body(OTP_CONFIRM_DEC)
+    sid, code = req.student_id, req.otp
+    # check first so unknown ids don't each leave a lock behind in OTP_LOCKS
+    if sid not in DATA["otps"]:
+        return fastjsonify({"verified": False, "reason": "no_otp_requested"}), 400
+    with OTP_LOCKS[sid]:
+        rec = DATA["otps"].get(sid)
+        if not rec:
+            return fastjsonify({"verified": False, "reason": "no_otp_requested"}), 400
+        # compare code and expiration
+        if rec.get("code") != code:
+            return fastjsonify({"verified": False, "reason": "invalid_code"}), 400
+        exp_ts = rec.get("exp_ts")
+        if exp_ts is None:
+            exp_ts = to_epoch(rec["expires_at"])
+        if exp_ts < time.time():
+            return fastjsonify({"verified": False, "reason": "expired"}), 400
+        DATA["otps"].pop(sid, None)
+        append_change("pop", {"key": "otps", "id": sid})
+        audit(sid, "otp_verified")
+        return fastjsonify({"verified": True})
 
 # ---------------- Audit logs & helpers ----------------
 @APP.route("/audit/logs", methods=["GET"])
 def get_audit_logs():
     since = request.args.get("since")
     logs = DATA.get("audit_logs", [])
+    start, end = 0, len(logs)
     if since:
         try:
-            sdt = datetime.datetime.fromisoformat(since.replace("Z", ""))
-            logs = [l for l in logs if datetime.datetime.fromisoformat(l["time"].replace("Z", "")) >= sdt]
-        except Exception:
+            cutoff = to_epoch(since)
+        except ValueError:
             pass
-    return jsonify({"count": len(logs), "logs": logs})
+        else:
+            # AUDIT_TIMES is non-decreasing (see audit_times), so bisect is safe;
+            # an entry stamped just before the cutoff may be included, never dropped
+            start = bisect.bisect_left(AUDIT_TIMES, cutoff)
+
+    # stream entry by entry rather than materializing the whole body
+    def generate():
+        yield b'{"count":%d,"logs":[' % max(0, end - start)
+        for i in range(start, end):
+            yield (b"," if i > start else b"") + orjson.dumps(logs[i])
+        yield b"]}"
+
+    return APP.response_class(generate(), mimetype="application/json")
 
 @APP.route("/students/<student_id>", methods=["GET"])
 def get_student(student_id):
     s = DATA.get("students", {}).get(student_id)
     if not s:
         abort(404)
-    return jsonify(s)
+    return fastjsonify(s)
 
 @APP.route("/courses", methods=["GET"])
 def list_courses():
-    return jsonify(list(DATA.get("courses", {}).values()))
+    return cached_json("courses", lambda: list(DATA.get("courses", {}).values()))
+
+@functools.lru_cache(maxsize=1)
+def health_body(now_iso):
+    # g.now_iso has second resolution, so probes within a second share one body
+    return orjson.dumps({"status": "ok", "time": now_iso})
 
 @APP.route("/health", methods=["GET"])
 def health():
-    return jsonify({"status": "ok", "time": now_iso()})
+    return APP.response_class(health_body(g.now_iso), mimetype="application/json")
 
 # admin testing - reload from disk (dev only)
 @APP.route("/admin/reset", methods=["POST"])
 def admin_reset():
-    global DATA
-    DATA = load_data()
+    global DATA, AUDIT_TIMES, STUDENT_COURSES
+    # audit() must not append between the reload and the AUDIT_TIMES rebuild
+    with AUDIT_LOCK:
+        DATA = load_data()
+        AUDIT_TIMES = audit_times(DATA["audit_logs"])
+    STUDENT_COURSES = student_course_index(DATA["enrollments"])
+    invalidate("courses")
+    invalidate("hostels")
     audit("admin", "reset")
-    return jsonify({"ok": True})
+    return fastjsonify({"ok": True})
 
 if __name__ == "__main__":
+    from waitress import serve
     # Allow port override via env var
     port = int(os.environ.get("PORT", 5000))
-    APP.run(host="0.0.0.0", port=port, debug=True)
+    # DATA lives in this process, so scale with threads rather than worker
+    # processes (e.g. gunicorn -w N would give each worker its own copy)
+    serve(APP, host="0.0.0.0", port=port, threads=int(os.environ.get("THREADS", 16)))